@@ -1,9 +1,13 @@
-import requests
+import aiohttp
+import asyncio
+import orjson
+import os
+import random
 import time
 from datetime import datetime
-import concurrent.futures
 import itertools
 import logging
+from logging.handlers import RotatingFileHandler
 
 # ログ設定
 logging.basicConfig(
@@ -12,15 +16,42 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s:%(message)s'
 )
 
+# 結果ログ（ファイルは起動時に一度だけ開き、ループごとの open/close を避ける）
+results_logger = logging.getLogger("results")
+results_logger.propagate = False
+_results_handler = RotatingFileHandler("dex_arbitrage_results.log", maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8")
+_results_handler.setFormatter(logging.Formatter("%(message)s"))
+results_logger.addHandler(_results_handler)
+
 # Jupiter APIのエンドポイント
 QUOTE_API_URL = "https://quote-api.jup.ag/v6/quote"
 
+# Jupiter APIへの同時リクエスト数と接続プールの最大接続数
+# （上げすぎると429とバックオフが増えてかえって遅くなる）
+MAX_CONNECTIONS = 6
+
+# 見積もりリクエストの同時実行数を MAX_CONNECTIONS 以下に制限する
+QUOTE_SEMAPHORE = asyncio.BoundedSemaphore(MAX_CONNECTIONS)
+
+# リクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 10
+
+# HTTPエラー時のリトライ設定（指数バックオフ + ジッター、最大60秒）
+QUOTE_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+BACKOFF_MAX = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 # トークンのMintアドレス
 TOKEN_MINTS = {
     "USDT": "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB",  # USDT
     "USDC": "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v",  # USDC
 }
 
+# Mintアドレスからトークン名への逆引き
+TOKEN_OF = {mint: token for token, mint in TOKEN_MINTS.items()}
+
 # スワップ量（単位：トークンの最小単位）
 AMOUNT = 1_000_000  # 1,000 トークン
 
@@ -29,179 +60,317 @@ SUPPORTED_DEXES = [
     "Raydium", "Orca V2"
 ]
 
+# 全DEXを1回の見積もりで指定するための dexes パラメータ
+DEXES_PARAM = ",".join(SUPPORTED_DEXES)
+
 # 実行間隔（秒）
 EXECUTION_INTERVAL = 30  # 30秒
 
+# 適応的ポーリングの待機間隔の下限・上限（秒）
+MIN_EXECUTION_INTERVAL = 5
+MAX_EXECUTION_INTERVAL = 120
+
+# 価格差（%）のループ間変化量のEWMAの目標値と平滑化係数
+VOLATILITY_TARGET = 0.01
+VOLATILITY_EWMA_ALPHA = 0.3
+
 # アービトラージの閾値（例: 0.1%）
 ARBITRAGE_THRESHOLD = 0.1  # 0.1%
 
-def get_quote(input_mint, output_mint, dex, retries=3, backoff=1):
+# 取引可能性の判定結果を保持する期間（秒）
+TRADABLE_TTL = 3600  # 1時間
+
+# 取引可能性キャッシュ：(input_mint, output_mint) -> (取引可能か, 有効期限)
+TRADABLE_CACHE = {}
+
+# 両方向で取引可能と確認したペアを保存するグラフファイル（mint -> 相手mintの一覧）
+TRADABLE_GRAPH_FILE = "tradable_graph.json"
+
+# 1回のループで新たに確認する未確認ペアの最大数
+EXPLORATION_BUDGET = 3
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    リトライまでの待機秒数を返す。Retry-Afterヘッダーがあればそれに従う。
+    """
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), BACKOFF_MAX)
+    return min(BACKOFF_FACTOR * (2 ** attempt), BACKOFF_MAX) + random.uniform(0, BACKOFF_JITTER)
+
+def error_envelope(status, body):
+    """
+    4xx応答の本文を error を含む辞書として返す。本文がJSONのエラーでなければHTTPステータスを使う。
+    """
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        data = None
+    if isinstance(data, dict) and "error" in data:
+        return data
+    return {"error": f"HTTP {status}"}
+
+async def fetch_quote(session, input_mint, output_mint, dex_param):
     """
-    指定したDEXでJupiter APIから価格見積もりを取得する。
-    リトライ機能付き。
+    指定したDEX（カンマ区切りで複数指定可）でJupiter APIから価格見積もりを取得する。
+    接続エラーと429/5xxは指数バックオフ + ジッターでリトライする。
+    APIが応答した場合（ルートなし・error を含む応答・4xxを含む）は辞書を返し、
+    リクエスト自体が失敗した場合はNoneを返す。
     """
     params = {
         "inputMint": input_mint,
         "outputMint": output_mint,
         "amount": AMOUNT,
         "slippageBps": 50,
-        "dexes": dex  # 特定のDEXを指定
+        "dexes": dex_param  # 特定のDEXを指定
     }
-    for attempt in range(retries):
+    for attempt in range(QUOTE_RETRIES + 1):
+        retry_after = None
         try:
-            response = requests.get(QUOTE_API_URL, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            logging.info(f"DEX: {dex}, Input: {input_mint}, Output: {output_mint}, Amount: {AMOUNT}, Response: {data}")
+            async with QUOTE_SEMAPHORE, session.get(QUOTE_API_URL, params=params) as response:
+                if 400 <= response.status < 500 and response.status not in RETRY_STATUSES:
+                    # ルートなし等でAPIが見積もりを拒否した
+                    data = error_envelope(response.status, await response.read())
+                else:
+                    response.raise_for_status()
+                    if response.content_length == 0:
+                        logging.error(f"DEX: {dex_param} からの応答が空です。")
+                        return None
+                    data = orjson.loads(await response.read())
+            if "error" in data:
+                logging.error(f"DEX: {dex_param}, Input: {input_mint}, Output: {output_mint} でエラーが返されました：{data['error']}")
+                return data
+            # 応答全体は記録せず、要約のみ記録する
+            logging.info(
+                f"DEX: {dex_param}, Input: {input_mint}, Output: {output_mint}, Amount: {AMOUNT}, "
+                f"outAmount: {data.get('outAmount')}, routes: {len(data.get('routePlan', []))}"
+            )
             return data
-        except requests.RequestException as e:
-            logging.error(f"DEX: {dex} でのリクエスト失敗（試行 {attempt + 1}/{retries}）：{e}")
-            time.sleep(backoff * (2 ** attempt))
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES:
+                logging.error(f"DEX: {dex_param} でのリクエスト失敗：{e}")
+                return None
+            error = e
+            if e.headers:
+                retry_after = e.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = e
+        except orjson.JSONDecodeError as e:
+            logging.error(f"DEX: {dex_param} でのリクエスト失敗：{e}")
+            return None
+        logging.error(f"DEX: {dex_param} でのリクエスト失敗（試行 {attempt + 1}/{QUOTE_RETRIES + 1}）：{error}")
+        if attempt < QUOTE_RETRIES:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
     return None
 
-def log_results(content):
+def is_tradable(input_mint, output_mint):
     """
-    ログファイルに結果を記録する。
+    キャッシュ済みの取引可能性を返す。
+    未判定または有効期限切れの場合は見積もりで再判定するためTrueを返す。
     """
-    with open("dex_arbitrage_results.log", "a") as log_file:
-        log_file.write(content + "\n")
+    cached = TRADABLE_CACHE.get((input_mint, output_mint))
+    if cached is None or cached[1] <= time.monotonic():
+        return True
+    return cached[0]
 
-def process_swap_direction(input_mint, output_mint):
+def record_tradable(input_mint, output_mint, tradable, ttl=TRADABLE_TTL):
     """
-    指定したトークンペアの指定方向でスワップ見積もりを取得し、最良の価格を返す。
-    価格は1トークンあたりに計算する。
+    見積もり結果から判定した取引可能性をキャッシュする。
     """
-    best_buy_price = 0
-    best_buy_dex = None
+    TRADABLE_CACHE[(input_mint, output_mint)] = (tradable, time.monotonic() + ttl)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = {executor.submit(get_quote, input_mint, output_mint, dex): dex for dex in SUPPORTED_DEXES}
-        for future in concurrent.futures.as_completed(futures):
-            dex = futures[future]
-            try:
-                quote_data = future.result()
-                if not quote_data or "routePlan" not in quote_data:
-                    logging.info(f"DEX: {dex} からの見積もりに有効なデータがありません。")
-                    continue
-                for route in quote_data["routePlan"]:
-                    swap_info = route["swapInfo"]
-                    in_amount = int(swap_info["inAmount"]) / 10**6  # 入力トークンの量
-                    out_amount = int(swap_info["outAmount"]) / 10**6 # 出力トークンの量
+def load_tradable_graph(path=TRADABLE_GRAPH_FILE):
+    """
+    取引可能グラフ（mint -> 取引可能な相手mintの集合）をファイルから読み込む。
+    """
+    try:
+        with open(path, "rb") as graph_file:
+            return {mint: set(peers) for mint, peers in orjson.loads(graph_file.read()).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, orjson.JSONDecodeError) as e:
+        logging.error(f"取引可能グラフ {path} の読み込みに失敗しました：{e}")
+        return {}
+
+def save_tradable_graph(graph, path=TRADABLE_GRAPH_FILE):
+    """
+    取引可能グラフをファイルに保存する。書き込み途中で壊れないよう一時ファイル経由で置き換える。
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as graph_file:
+            graph_file.write(orjson.dumps({mint: sorted(peers) for mint, peers in graph.items()}))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error(f"取引可能グラフ {path} の保存に失敗しました：{e}")
 
-                    # 価格計算を正しく修正
-                    price = out_amount / in_amount  # 単純に出力量/入力量
+def update_tradable_graph(graph, mint_a, mint_b, tradable):
+    """
+    ペアの取引可能性をグラフに反映する。グラフが変化した場合はTrueを返す。
+    """
+    if tradable == (mint_b in graph.get(mint_a, ())):
+        return False
+    if tradable:
+        graph.setdefault(mint_a, set()).add(mint_b)
+        graph.setdefault(mint_b, set()).add(mint_a)
+    else:
+        graph[mint_a].discard(mint_b)
+        graph.get(mint_b, set()).discard(mint_a)
+    return True
+
+def quote_price(quote_data):
+    """
+    見積もり全体の inAmount / outAmount から価格と使用したDEXを返す。有効なルートが無ければ (0, None) を返す。
+    価格がサニティチェックに通らない場合は、見積もりの取得失敗と同様に扱うためNoneを返す。
+    ルートは複数DEXへの分割や中継トークンを含むため、価格は見積もり全体で計算し、
+    各ルートの swapInfo のラベルは使用したDEXの表示にのみ使う。価格は1トークンあたりに計算する。
+    """
+    if not quote_data or not quote_data.get("routePlan"):
+        logging.info(f"DEX: {DEXES_PARAM} からの見積もりに有効なデータがありません。")
+        return 0, None
 
-                    # サニティチェック：価格が市場の範囲内か確認
-                    if price < 0 or price > 100:  # 例えば1トークンあたり100以下を想定
-                        logging.warning(f"DEX: {dex} から取得した価格 {price} は不正です。無視します。")
-                        continue
+    # 使用したDEX（重複を除き、ルート順）
+    dexes = ", ".join(dict.fromkeys(route["swapInfo"].get("label") or "?" for route in quote_data["routePlan"]))
 
-                    if price > best_buy_price:
-                        best_buy_price = price
-                        best_buy_dex = dex
-            except Exception as e:
-                logging.error(f"DEX: {dex}でエラーが発生しました: {e}")
+    in_amount = int(quote_data["inAmount"]) / 10**6  # 入力トークンの量
+    out_amount = int(quote_data["outAmount"]) / 10**6 # 出力トークンの量
+    price = out_amount / in_amount  # 単純に出力量/入力量
 
-    return best_buy_price, best_buy_dex
+    # サニティチェック：価格が市場の範囲内か確認
+    if price < 0 or price > 100:  # 例えば1トークンあたり100以下を想定
+        logging.warning(f"DEX: {dexes} から取得した価格 {price} は不正です。無視します。")
+        return None
 
-def is_pair_tradable(input_mint, output_mint):
+    return price, dexes
+
+def price_spread(buy_price, sell_price):
     """
-    指定したトークンペアが取引可能かどうかを確認する。
+    買い価格と売り価格から、理論的な売却レート（1 / buy_price）に対する価格差と価格差（%）を返す。
+    価格差（%）は (sell_price / (1 / buy_price) - 1) * 100 を除算なしで計算する。
     """
-    test_dex = SUPPORTED_DEXES[0]  # 任意のDEXでテスト
-    params = {
-        "inputMint": input_mint,
-        "outputMint": output_mint,
-        "amount": AMOUNT,
-        "slippageBps": 50,
-        "dexes": test_dex
-    }
-    try:
-        response = requests.get(QUOTE_API_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if "error" in data:
-            logging.info(f"ペア {input_mint} ↔ {output_mint} にエラーが含まれています。取引不可能です。")
-            return False
-        if "routePlan" in data and len(data["routePlan"]) > 0:
-            return True
-        logging.info(f"ペア {input_mint} ↔ {output_mint} に有効なルートがありません。取引不可能です。")
-        return False
-    except requests.RequestException as e:
-        logging.error(f"ペア {input_mint} ↔ {output_mint} の取引可能性確認中にエラーが発生しました：{e}")
-        return False
+    price_diff = sell_price - 1 / buy_price
+    price_diff_percentage = (sell_price * buy_price - 1) * 100
+    return price_diff, price_diff_percentage
 
-def main():
+def next_poll_interval(volatility_ewma, max_diff_percentage):
+    """
+    価格差の変化量のEWMAと閾値への近さから次の待機間隔（秒）を決める。
+    価格差が大きく動いている、または閾値に近いときは間隔を短くする。
+    """
+    if max_diff_percentage is not None and max_diff_percentage >= ARBITRAGE_THRESHOLD / 2:
+        return MIN_EXECUTION_INTERVAL
+    if volatility_ewma is None:
+        return EXECUTION_INTERVAL
+    if volatility_ewma == 0:
+        return MAX_EXECUTION_INTERVAL
+    interval = EXECUTION_INTERVAL * (VOLATILITY_TARGET / volatility_ewma)
+    return min(MAX_EXECUTION_INTERVAL, max(MIN_EXECUTION_INTERVAL, interval))
+
+async def main():
     """
     メイン処理：すべてのトークンペアで価格見積もりを取得し、アービトラージの機会を特定。
     スワップ量を固定して実行。
     """
-    while True:
-        print("価格見積もりを取得中...")
-        log_content = f"--- 実行日時: {datetime.now()} ---\n"
-
-        # スワップ量の固定
-        current_amount = AMOUNT / 1_000_000  # トークン数（例: 1,000）
-        print(f"スワップ量: {current_amount} トークン")
-
-        tokens = list(TOKEN_MINTS.keys())
-        token_pairs = list(itertools.combinations(tokens, 2))
-
-        tradable_pairs = []
-        print("取引可能なペアを確認中...")
-        for pair in token_pairs:
-            token_a, token_b = pair
-            mint_a = TOKEN_MINTS[token_a]
-            mint_b = TOKEN_MINTS[token_b]
-            if is_pair_tradable(mint_a, mint_b) and is_pair_tradable(mint_b, mint_a):
-                tradable_pairs.append(pair)
-            else:
-                print(f"ペア {token_a} ↔ {token_b} は取引不可能です。スキップします。")
-
-        if not tradable_pairs:
-            log_content += f"スワップ量: {current_amount} トークン - 取引可能なペアが見つかりませんでした。\n"
-            print(log_content)
-            log_results(log_content)
-            time.sleep(EXECUTION_INTERVAL)
-            continue
-
-        arbitrage_opportunities = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            future_to_pair = {}
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        mint_pairs = list(itertools.combinations(TOKEN_MINTS.values(), 2))
+        tradable_graph = load_tradable_graph()
+        prev_diff_percentages = {}
+        volatility_ewma = None
+        while True:
+            print("価格見積もりを取得中...")
+            log_parts = [f"--- 実行日時: {datetime.now()} ---\n"]
+
+            # スワップ量の固定
+            current_amount = AMOUNT / 1_000_000  # トークン数（例: 1,000）
+            print(f"スワップ量: {current_amount} トークン")
+
+            # 取引可能性は見積もり結果から判定する。取引不可能と判定済みのペアは
+            # TRADABLE_TTL 秒の間スキップする。グラフに登録済みのペアは毎回、
+            # 未確認のペアは1回のループで EXPLORATION_BUDGET 件までランダムに見積もる。
+            known_pairs = []
+            unknown_pairs = []
+            for pair in mint_pairs:
+                mint_a, mint_b = pair
+                if not (is_tradable(mint_a, mint_b) and is_tradable(mint_b, mint_a)):
+                    print(f"ペア {TOKEN_OF[mint_a]} ↔ {TOKEN_OF[mint_b]} は取引不可能です。スキップします。")
+                elif mint_b in tradable_graph.get(mint_a, ()):
+                    known_pairs.append(pair)
+                else:
+                    unknown_pairs.append(pair)
+            tradable_pairs = known_pairs + random.sample(unknown_pairs, min(EXPLORATION_BUDGET, len(unknown_pairs)))
+
+            if not tradable_pairs:
+                log_parts.append(f"スワップ量: {current_amount} トークン - 取引可能なペアが見つかりませんでした。\n")
+                log_content = "".join(log_parts)
+                print(log_content)
+                results_logger.info(log_content)
+                prev_diff_percentages = {}
+                await asyncio.sleep(EXECUTION_INTERVAL)
+                continue
+
+            arbitrage_opportunities = []
+            diff_changes = []
+            # 今回価格差を計算したペアのみ保持し、スキップしたペアの前回値は破棄する
+            diff_percentages = {}
+            max_diff_percentage = None
+
+            # 全ペア・全方向の見積もりを、全DEXを指定した1リクエストずつで同時に発行する
+            quote_keys = []
+            tasks = []
             for pair in tradable_pairs:
-                token_a, token_b = pair
-                mint_a = TOKEN_MINTS[token_a]
-                mint_b = TOKEN_MINTS[token_b]
-                future_buy = executor.submit(process_swap_direction, mint_a, mint_b)
-                future_sell = executor.submit(process_swap_direction, mint_b, mint_a)
-                future_to_pair[future_buy] = (pair, "A->B")
-                future_to_pair[future_sell] = (pair, "B->A")
-
-            results = {}
-            for future in concurrent.futures.as_completed(future_to_pair):
-                pair, direction = future_to_pair[future]
+                mint_a, mint_b = pair
+                for direction, (mint_in, mint_out) in (("A->B", (mint_a, mint_b)), ("B->A", (mint_b, mint_a))):
+                    quote_keys.append((pair, direction))
+                    tasks.append(fetch_quote(session, mint_in, mint_out, DEXES_PARAM))
+            quotes = await asyncio.gather(*tasks, return_exceptions=True)
+
+            # 方向ごとの価格（と使用したDEX）を求める。見積もりの取得に失敗した方向や
+            # 価格が不正だった方向はNoneのまま
+            results = {pair: {"A->B": None, "B->A": None} for pair in tradable_pairs}
+            for (pair, direction), quote_data in zip(quote_keys, quotes):
+                if isinstance(quote_data, Exception):
+                    logging.error(f"DEX: {DEXES_PARAM}でエラーが発生しました: {quote_data}")
+                    continue
+                if quote_data is None:
+                    continue
                 try:
-                    price, dex = future.result()
-                    if pair not in results:
-                        results[pair] = {}
-                    results[pair][direction] = (price, dex)
+                    results[pair][direction] = quote_price(quote_data)
                 except Exception as e:
-                    print(f"ペア: {pair} の {direction} 方向でエラーが発生しました: {e}")
-
-        for pair, directions in results.items():
-            token_a, token_b = pair
-            if "A->B" in directions and "B->A" in directions:
-                buy_price, buy_dex = directions["A->B"]
-                sell_price, sell_dex = directions["B->A"]
-
-                if buy_price == 0 or sell_price == 0:
+                    logging.error(f"DEX: {DEXES_PARAM}でエラーが発生しました: {e}")
+
+            graph_changed = False
+            for pair, directions in results.items():
+                mint_a, mint_b = pair
+                token_a, token_b = TOKEN_OF[mint_a], TOKEN_OF[mint_b]
+                buy = directions["A->B"]
+                sell = directions["B->A"]
+
+                # APIがルートなしと応答した方向は取引不可能として記録する。
+                # 通信エラー等で見積もりが取れなかった方向は判定に使わない。
+                if buy is not None:
+                    record_tradable(mint_a, mint_b, buy[0] != 0)
+                if sell is not None:
+                    record_tradable(mint_b, mint_a, sell[0] != 0)
+                buy_price, buy_dex = buy or (0, None)
+                sell_price, sell_dex = sell or (0, None)
+                tradable = buy_price != 0 and sell_price != 0
+                if buy is None or sell is None:
+                    print(f"ペア {token_a} ↔ {token_b} の見積もりを取得できませんでした。スキップします。")
                     continue
+                if update_tradable_graph(tradable_graph, mint_a, mint_b, tradable):
+                    graph_changed = True
+                if not tradable:
+                    print(f"ペア {token_a} ↔ {token_b} は取引不可能です。スキップします。")
+                    continue
+
+                price_diff, price_diff_percentage = price_spread(buy_price, sell_price)
 
-                # 理論的な売却レート: 1 / buy_price
-                theoretical_sell_price = 1 / buy_price
-                price_diff = sell_price - theoretical_sell_price
-                price_diff_percentage = (price_diff / theoretical_sell_price) * 100
+                if pair in prev_diff_percentages:
+                    diff_changes.append(abs(price_diff_percentage - prev_diff_percentages[pair]))
+                diff_percentages[pair] = price_diff_percentage
+                if max_diff_percentage is None or price_diff_percentage > max_diff_percentage:
+                    max_diff_percentage = price_diff_percentage
 
                 if price_diff_percentage >= ARBITRAGE_THRESHOLD:
                     opportunity = (
@@ -214,7 +383,7 @@ def main():
                     )
                     arbitrage_opportunities.append(opportunity)
                 else:
-                    log_content += (
+                    log_parts.append(
                         f"\nスワップ量: {current_amount} トークン\n"
                         f"トークンペア: {token_a} ↔ {token_b}\n"
                         f"  買い: {token_a} -> {token_b} at {buy_price:.6f} {token_b} per {token_a} (DEX: {buy_dex})\n"
@@ -223,17 +392,29 @@ def main():
                         f"  アービトラージの機会は検出されませんでした\n"
                     )
 
-        if arbitrage_opportunities:
-            for opp in arbitrage_opportunities:
-                log_content += opp
-        else:
-            log_content += "\nアービトラージの機会は検出されませんでした。\n"
+            if graph_changed:
+                save_tradable_graph(tradable_graph)
 
-        print(log_content)
-        log_results(log_content)
+            if arbitrage_opportunities:
+                log_parts.extend(arbitrage_opportunities)
+            else:
+                log_parts.append("\nアービトラージの機会は検出されませんでした。\n")
 
-        # 指定間隔待機
-        time.sleep(EXECUTION_INTERVAL)
+            log_content = "".join(log_parts)
+            print(log_content)
+            results_logger.info(log_content)
+
+            # 価格差の変動と閾値への近さに応じて待機間隔を調整する
+            prev_diff_percentages = diff_percentages
+            if diff_changes:
+                change = max(diff_changes)
+                if volatility_ewma is None:
+                    volatility_ewma = change
+                else:
+                    volatility_ewma = VOLATILITY_EWMA_ALPHA * change + (1 - VOLATILITY_EWMA_ALPHA) * volatility_ewma
+            next_sleep = next_poll_interval(volatility_ewma, max_diff_percentage)
+            logging.info(f"次の見積もりまで {next_sleep:.1f} 秒待機します。")
+            await asyncio.sleep(next_sleep)
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())